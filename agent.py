@@ -1,22 +1,36 @@
 # agent.py
 
+import asyncio
+
+import logging
+
 import os
 
-import json
+import re
+
+import string
+
+from typing import Optional
+
+import orjson
 
 import streamlit as st
 
+from pydantic import BaseModel, Field
+
 from langchain_openai import AzureChatOpenAI
 
-from langchain.agents import AgentExecutor, create_openai_tools_agent
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+
+from langchain_core.callbacks.base import BaseCallbackHandler
 
-from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.messages import SystemMessage, trim_messages
 
-from langchain.memory import ConversationBufferMemory
+from langchain_core.messages.utils import count_tokens_approximately
 
-from langchain_community.chat_message_histories import StreamlitChatMessageHistory
+# langchain.agents, langchain.memory and langchain_community are imported where they are used,
 
-from langchain.callbacks.base import BaseCallbackHandler
+# so the module (and the startup health check) only pays for langchain_core and langchain_openai
 
 from azure_tools import (
 
@@ -26,6 +40,10 @@ from azure_tools import (
 
     get_run_activity_logs,
 
+    get_run_activity_logs_bulk,
+
+    get_activity_full_payload,
+
     list_all_data_factories_in_subscription,
 
     get_pipeline_definition,
@@ -36,19 +54,78 @@ from azure_tools import (
 
     get_pipeline_run,
 
+    batch,
+
 )
 
-llm = AzureChatOpenAI(
+def _new_llm(**kwargs):
 
-    azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+    """Creates an Azure OpenAI chat client from the environment settings."""
 
-    api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+    return AzureChatOpenAI(
 
-    azure_deployment=os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME"),
+        azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
 
-    api_version=os.getenv("AZURE_OPENAI_API_VERSION"),
+        api_key=os.getenv("AZURE_OPENAI_API_KEY"),
 
-)
+        azure_deployment=os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME"),
+
+        api_version=os.getenv("AZURE_OPENAI_API_VERSION"),
+
+        **kwargs,
+
+    )
+
+
+logger = logging.getLogger(__name__)
+
+logging.getLogger("langchain").setLevel(logging.WARNING)
+
+# Agent step tracing to stdout; off unless LC_VERBOSE=1
+
+VERBOSE = os.getenv("LC_VERBOSE", "0") == "1"
+
+
+@st.cache_resource
+
+def get_llm():
+
+    """Returns the Azure OpenAI chat client, created once per process."""
+
+    return _new_llm(streaming=True)
+
+
+@st.cache_resource
+
+def get_analysis_llm():
+
+    """
+
+    Returns the client used by the one-shot analysis helpers.
+
+    Runs at temperature 0 and stores responses in an on-disk exact-match cache, so recurring ADF errors skip the round-trip.
+
+    """
+
+    from langchain_community.cache import SQLiteCache
+
+    return _new_llm(temperature=0, cache=SQLiteCache(database_path=os.getenv("LLM_CACHE_PATH", ".lcache.db")))
+
+
+_GUID_RE = re.compile(r"\b[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\b", re.IGNORECASE)
+
+_TIMESTAMP_RE = re.compile(r"\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:\.\d+)?(?:Z|[+-]\d{2}:?\d{2})?")
+
+
+def _normalize_error_message(error_message: str) -> str:
+
+    """Masks run IDs and timestamps so repeats of the same error produce the same prompt."""
+
+    normalized = _GUID_RE.sub("<id>", error_message)
+
+    normalized = _TIMESTAMP_RE.sub("<timestamp>", normalized)
+
+    return normalized.strip()
 
 tools = [
 
@@ -58,6 +135,10 @@ tools = [
 
     get_run_activity_logs,
 
+    get_run_activity_logs_bulk,
+
+    get_activity_full_payload,
+
     list_all_data_factories_in_subscription,
 
     get_pipeline_definition,
@@ -68,6 +149,8 @@ tools = [
 
     get_pipeline_run,
 
+    batch,
+
 ]
 
 system_prompt_template = """You are an expert AI assistant specialized EXCLUSIVELY in Azure Data Factory (ADF).
@@ -118,7 +201,7 @@ You have access to powerful tools to:
 
 When a user asks you to "fix a pipeline", be EFFICIENT and follow these steps:
 
-1. **Get Recent Runs**: Use `get_pipeline_runs` to find the most recent failed run
+1. **Get Recent Runs**: Use `get_pipeline_runs` with `status="Failed"` to find the most recent failed run
 
 2. **Get Activity Logs**: Use `get_run_activity_logs` to see the error
 
@@ -138,6 +221,14 @@ IMPORTANT:
 
 - Only use tools that are absolutely necessary
 
+**PARALLEL LOOKUPS:**
+
+When you need to call multiple independent read-only tools (list_pipelines, get_pipeline_runs, get_run_activity_logs, get_pipeline_definition, get_pipeline_run on different targets), emit a single `batch` call instead of sequential calls.
+
+When you already have several run IDs (e.g. a list of failed runs), use `get_run_activity_logs_bulk` instead of calling `get_run_activity_logs` once per run.
+
+Activity logs include the full error but only a short preview of a failed activity's input/output. Call `get_activity_full_payload` for one activity only when the preview is not enough to diagnose the problem.
+
 **IMPORTANT FOR update_pipeline TOOL:**
 
 When calling update_pipeline, you MUST provide the complete pipeline_definition dictionary with these keys:
@@ -160,17 +251,17 @@ update_pipeline(
 
     pipeline_name="pipeline-name",
 
-    pipeline_definition={{
+    pipeline_definition={
 
         "activities": [...],  # Full activities list from get_pipeline_definition
 
-        "parameters": {{...}},
+        "parameters": {...},
 
-        "variables": {{...}},
+        "variables": {...},
 
         "annotations": [...]
 
-    }}
+    }
 
 )
 
@@ -196,62 +287,143 @@ Always be professional, thorough, and helpful within your Azure Data Factory exp
 
 """
 
-prompt = ChatPromptTemplate.from_messages(
+@st.cache_resource
 
-    [
+def get_prompt():
 
-        ("system", system_prompt_template),
+    """
 
-        MessagesPlaceholder(variable_name="chat_history"),
+    Compiles the agent prompt once per process.
 
-        ("human", "{input}"),
+    The system prompt is a literal message, so its text is never scanned for template variables.
 
-        MessagesPlaceholder(variable_name="agent_scratchpad"),
+    """
 
-    ]
+    return ChatPromptTemplate.from_messages(
 
-)
+        [
 
+            SystemMessage(content=system_prompt_template),
 
-class StreamlitCallbackHandler(BaseCallbackHandler):
+            MessagesPlaceholder(variable_name="chat_history"),
 
-    """Callback handler for streaming updates to Streamlit."""
+            ("human", "{input}"),
 
-    def __init__(self, status_container):
+            MessagesPlaceholder(variable_name="agent_scratchpad"),
 
-        self.status_container = status_container
+        ]
 
-        self.current_step = ""
+    )
 
-    def on_tool_start(self, serialized, input_str, **kwargs):
 
-        """Called when a tool starts executing."""
+# Answer returned (and kept in chat history with the question) when the agent hits max_iterations or max_execution_time
 
-        tool_name = serialized.get("name", "Unknown Tool")
+_AGENT_STOPPED_MESSAGE = "I ran out of steps before finishing this request. Please ask a narrower question, e.g. about a single pipeline or run ID."
+
+
+@st.cache_resource
+
+def get_agent_executor():
+
+    """
+
+    Builds the tool-calling agent once per process and shares it across sessions.
+
+    Chat memory is not attached here; each ChatAgent loads and saves its own history.
+
+    """
+
+    from langchain.agents import AgentExecutor, create_openai_tools_agent
+
+    from langchain.agents.agent import RunnableMultiActionAgent
+
+    from langchain_core.agents import AgentFinish
+
+    class _StopAwareAgent(RunnableMultiActionAgent):
+
+        """Flags an early stop in the executor output instead of returning LangChain's canned stop text."""
+
+        def return_stopped_response(self, early_stopping_method, intermediate_steps, **kwargs):
+
+            return AgentFinish({"output": _AGENT_STOPPED_MESSAGE, "stopped": True}, "")
+
+    agent = _StopAwareAgent(runnable=create_openai_tools_agent(get_llm(), tools, get_prompt()))
+
+    return AgentExecutor(
+
+        agent=agent,
+
+        tools=tools,
+
+        verbose=VERBOSE,
 
-        # Map tool names to user-friendly messages
+        handle_parsing_errors=True,
 
-        tool_messages = {
+        max_iterations=5,  # The fix workflow takes 4 steps (runs, logs, definition, answer); one spare
 
-            "list_pipelines": "📋 Fetching list of pipelines...",
+        max_execution_time=60,  # Hard wall-clock limit in seconds
 
-            "get_pipeline_runs": "🔄 Retrieving pipeline run history...",
+        return_intermediate_steps=False,
 
-            "get_run_activity_logs": "📊 Analyzing activity logs...",
+        early_stopping_method="force",  # Stop without an extra LLM call; see _StopAwareAgent
 
-            "list_all_data_factories_in_subscription": "🏭 Loading data factories...",
+    )
 
-            "get_pipeline_definition": "📝 Reading pipeline definition...",
 
-            "update_pipeline": "🔧 Applying pipeline fix...",
+# Map tool names to user-friendly messages
 
-            "create_pipeline_run": "▶️ Starting pipeline execution...",
+_TOOL_MESSAGES = {
 
-            "get_pipeline_run": "⏱️ Checking pipeline status...",
+    "list_pipelines": "📋 Fetching list of pipelines...",
+
+    "get_pipeline_runs": "🔄 Retrieving pipeline run history...",
+
+    "get_run_activity_logs": "📊 Analyzing activity logs...",
+
+    "get_run_activity_logs_bulk": "📊 Analyzing activity logs for several runs...",
+
+    "get_activity_full_payload": "🔎 Loading full activity payload...",
+
+    "list_all_data_factories_in_subscription": "🏭 Loading data factories...",
+
+    "get_pipeline_definition": "📝 Reading pipeline definition...",
+
+    "update_pipeline": "🔧 Applying pipeline fix...",
+
+    "create_pipeline_run": "▶️ Starting pipeline execution...",
+
+    "get_pipeline_run": "⏱️ Checking pipeline status...",
+
+    "batch": "📦 Running several lookups in parallel...",
+
+}
+
+
+class StreamlitCallbackHandler(BaseCallbackHandler):
+
+    """Callback handler for streaming updates to Streamlit."""
 
-        }
+    # Run on the event loop thread so Streamlit calls keep their script context
 
-        message = tool_messages.get(tool_name, f"🔧 Using tool: {tool_name}")
+    run_inline = True
+
+    def __init__(self, status_container, placeholder=None):
+
+        self.status_container = status_container
+
+        self.placeholder = placeholder
+
+        self.current_step = ""
+
+        self._buf = []
+
+    def on_tool_start(self, serialized, input_str, **kwargs):
+
+        """Called when a tool starts executing."""
+
+        tool_name = serialized.get("name", "Unknown Tool")
+
+        message = _TOOL_MESSAGES.get(tool_name, f"🔧 Using tool: {tool_name}")
 
         self.current_step = message
 
@@ -273,8 +445,22 @@ class StreamlitCallbackHandler(BaseCallbackHandler):
 
         """Called when LLM starts."""
 
+        self._buf = []
+
         self.status_container.update(label="🤖 AI analyzing your request...")
 
+    def on_llm_new_token(self, token, **kwargs):
+
+        """Called for each streamed token; renders the partial answer."""
+
+        if self.placeholder is None or not token:
+
+            return
+
+        self._buf.append(token)
+
+        self.placeholder.markdown("".join(self._buf))
+
     def on_agent_action(self, action, **kwargs):
 
         """Called when agent decides on an action."""
@@ -282,13 +468,22 @@ class StreamlitCallbackHandler(BaseCallbackHandler):
         self.status_container.update(label="💭 Processing...")
 
 
+# Upper bound on prior-conversation tokens sent with each request
+
+MAX_HISTORY_TOKENS = 2000
+
+
 class ChatAgent:
 
     def __init__(self, session_key="langchain_messages"):
 
+        from langchain.memory import ConversationBufferMemory
+
+        from langchain_community.chat_message_histories import StreamlitChatMessageHistory
+
         try:
 
-            # Use simpler memory without token counting issues
+            # Full history stays in session state for display; the prompt gets a token window of it
 
             self.memory = ConversationBufferMemory(
 
@@ -300,73 +495,71 @@ class ChatAgent:
 
             )
 
-            agent = create_openai_tools_agent(llm, tools, prompt)
+            self.agent_executor = get_agent_executor()
 
-            self.agent_executor = AgentExecutor(
-
-                agent=agent,
+        except Exception as e:
 
-                tools=tools,
+            logger.error("Error initializing ChatAgent: %s", e)
 
-                memory=self.memory,
+            raise
 
-                verbose=True,
+    def get_agent_response(self, user_query, resource_group, data_factory, status_container, placeholder=None):
 
-                handle_parsing_errors=True,
+        """
 
-                max_iterations=5,  #
+        Process user query and return AI response.
 
-                return_intermediate_steps=False,
+        Includes context about current resource group and data factory.
 
-                early_stopping_method="generate",  # Stop early if possible
+        If a placeholder (e.g. st.empty()) is given, answer tokens are streamed into it.
 
-            )
+        """
 
-        except Exception as e:
+        # Build contextual query; the per-turn context goes last so the shared prompt prefix stays stable
 
-            print(f"Error initializing ChatAgent: {e}")
+        contextual_query = f"User's question: {user_query}\n\nCurrent context:\n- Resource Group: '{resource_group}'\n- Data Factory: '{data_factory}'"
 
-            raise
+        try:
 
-    def get_agent_response(self, user_query, resource_group, data_factory, status_container):
+            # Create callback handler
 
-        """
+            callback_handler = StreamlitCallbackHandler(status_container, placeholder)
 
-        Process user query and return AI response.
+            # Execute agent with callbacks
 
-        Includes context about current resource group and data factory.
+            status_container.update(label="🤖 AI processing your request...")
 
-        """
+            # The executor is shared across sessions, so history is loaded and saved here
 
-        # Build contextual query
+            chat_history = trim_messages(
 
-        contextual_query = f"""
+                self.memory.chat_memory.messages,
 
-        Current context:
+                max_tokens=MAX_HISTORY_TOKENS,
 
-        - Resource Group: '{resource_group}'
+                # The Azure client has no model name for tiktoken, so count without one
 
-        - Data Factory: '{data_factory}'
+                token_counter=count_tokens_approximately,
 
-        User's question: {user_query}
+                strategy="last",
 
-        """
+                start_on="human",
 
-        try:
+            )
 
-            # Create callback handler
+            inputs = {"input": contextual_query, "chat_history": chat_history}
 
-            callback_handler = StreamlitCallbackHandler(status_container)
+            # Async execution lets parallel tool calls in one turn run concurrently
 
-            # Execute agent with callbacks
+            response = asyncio.run(
 
-            status_container.update(label="🤖 AI processing your request...")
+                self.agent_executor.ainvoke(
 
-            response = self.agent_executor.invoke(
+                    inputs,
 
-                {"input": contextual_query},
+                    config={"callbacks": [callback_handler]}
 
-                config={"callbacks": [callback_handler]}
+                )
 
             )
 
@@ -390,6 +583,12 @@ class ChatAgent:
 
                 return f"I received an incomplete response. Response keys: {list(response.keys())}. Please try rephrasing your question."
 
+            if response.get("stopped"):
+
+                logger.warning("Agent stopped at the iteration or time limit")
+
+            self.memory.save_context({"input": contextual_query}, {"output": agent_output})
+
             if not agent_output.strip():
 
                 return "I couldn't generate a meaningful response. Please try asking your question in a different way."
@@ -398,27 +597,31 @@ class ChatAgent:
 
         except Exception as e:
 
-            import traceback
+            # The logger formats the traceback only if a handler emits the record
 
-            error_msg = str(e)
+            logger.exception("Agent error")
 
-            traceback_str = traceback.format_exc()
+            # Keep the user-facing message to a short first line of the error
 
-            print(f"Agent error: {error_msg}")
-
-            print(f"Traceback: {traceback_str}")
+            error_msg = (str(e).strip().splitlines() or [type(e).__name__])[0][:200]
 
             return f"I encountered an error while processing your request: {error_msg}\n\nPlease try rephrasing your question or ask something else about Azure Data Factory."
 
 
+@st.cache_data(ttl=3600, show_spinner=False)
+
 def get_error_analysis(error_message: str) -> str:
 
     """
 
     Asks the LLM to provide a human-readable analysis of an error message.
 
+    Results are memoized in-process for an hour, ahead of the on-disk LLM cache.
+
     """
 
+    error_message = _normalize_error_message(error_message)
+
     analysis_prompt = f"""
 
     As an expert Azure Data Factory developer, please analyze the following error message from a pipeline run.
@@ -441,85 +644,259 @@ def get_error_analysis(error_message: str) -> str:
 
     """
 
-    response = llm.invoke(analysis_prompt)
+    response = get_analysis_llm().invoke(analysis_prompt)
 
     return response.content
 
 
-def get_pipeline_fix_json(pipeline_definition: str, error_message: str, activity_name: str) -> str:
+# Example answer embedded in the fix prompt, serialized once at import
 
-    """
+_MANUAL_INTERVENTION_EXAMPLE = orjson.dumps({"manual_intervention_required": "The error indicates a credential issue with the source linked service 'AzureBlobStorage1'. Please navigate to the Azure portal, open this linked service, test the connection, and update the credentials."}).decode()
 
-    Asks the LLM to analyze a pipeline definition and an error, and return a modified JSON to fix it.
 
-    """
+# Fix prompt compiled once; the example answer is substituted at import, the rest per call
 
-    analysis_prompt = f"""
+_FIX_PROMPT = string.Template(string.Template("""
 
     You are an expert Azure Data Factory automated debugging agent. Your task is to fix a broken pipeline.
 
-    You will be given the full JSON definition of an ADF pipeline, the name of the failed activity, and the error message from that activity.
+    You will be given the JSON definition of an ADF pipeline (or the excerpt of it relevant to the failure), the name of the failed activity, and the error message from that activity.
 
     Your goal is to modify the pipeline JSON to correct the error.
 
     **Instructions:**
 
-    1.  Analyze the provided `pipeline_definition` JSON and the `error_message`.
+    1.  Analyze the provided pipeline JSON and the `error_message`.
 
-    2.  Identify the root cause of the error within the activity named `{activity_name}`.
+    2.  Identify the root cause of the error within the activity named `$activity_name`.
 
     3.  Modify the JSON to implement a plausible fix. Common fixes might involve correcting typos in properties, changing linked service names, fixing dynamic content expressions, or adjusting activity settings.
 
-    4.  **Output Format**: You MUST respond in one of two formats:
+    4.  **Output Format**: You MUST set exactly one of the response fields:
 
-        a. **If a programmatic fix is possible**: Return ONLY the complete, modified, and valid JSON for the entire pipeline. Do not include any explanations, apologies, or introductory text. The output must be parsable as JSON.
+        a. **If a programmatic fix is possible**: $fix_instruction
 
-        b. **If a fix requires manual intervention**: If the error is due to expired credentials, incorrect permissions, network connectivity issues, or problems in external systems that cannot be fixed by modifying the pipeline JSON, return a JSON object with a single key "manual_intervention_required". The value should be a string explaining the problem and the steps the user must take manually. For example: {json.dumps({"manual_intervention_required": "The error indicates a credential issue with the source linked service 'AzureBlobStorage1'. Please navigate to the Azure portal, open this linked service, test the connection, and update the credentials."})}
+        b. **If a fix requires manual intervention**: If the error is due to expired credentials, incorrect permissions, network connectivity issues, or problems in external systems that cannot be fixed by modifying the pipeline JSON, set `manual_intervention_required` to a string explaining the problem and the steps the user must take manually. For example: $manual_intervention_example
 
     **IMPORTANT**: Do not suggest placeholder changes. The modifications should be specific and directly address the error. Do not change the pipeline name or activity names.
 
     ---
 
-    **Pipeline Definition (JSON):**
+    **$definition_label:**
 
-    {pipeline_definition}
+    $definition_text
 
     ---
 
     **Failed Activity Name:**
 
-    {activity_name}
+    $activity_name
 
     ---
 
     **Error Message:**
 
-    {error_message}
+    $error_message
 
     ---
 
     Now, provide your response based on the instructions.
 
+    """).safe_substitute(manual_intervention_example=_MANUAL_INTERVENTION_EXAMPLE))
+
+
+class PipelineFix(BaseModel):
+
+    """Structured answer to the pipeline-fix prompt; exactly one field is set."""
+
+    pipeline_definition: Optional[dict] = Field(
+
+        default=None,
+
+        description="The complete, modified JSON for the entire pipeline, if the full pipeline was provided and the error can be fixed programmatically.",
+
+    )
+
+    fixed_activity: Optional[dict] = Field(
+
+        default=None,
+
+        description="The complete, modified JSON of the failed activity only, if a pipeline excerpt was provided and the error can be fixed programmatically.",
+
+    )
+
+    manual_intervention_required: Optional[str] = Field(
+
+        default=None,
+
+        description="The problem and the manual steps the user must take, if the pipeline JSON cannot fix it.",
+
+    )
+
+
+def _pipeline_activities(pipeline: dict) -> list:
+
+    """Returns the top-level activities list of an ADF pipeline dict (REST or SDK shape)."""
+
+    properties = pipeline.get("properties", pipeline)
+
+    return properties.get("activities") or []
+
+
+def _focus_pipeline(pipeline: dict, activity_name: str):
+
     """
 
-    response = llm.invoke(analysis_prompt)
+    Extracts the failed activity, the activities it depends on, and the pipeline parameters/variables.
 
-    return response.content
+    Returns None when the activity is not a top-level activity, so the caller can fall back to the full pipeline.
+
+    """
+
+    activities = _pipeline_activities(pipeline)
+
+    target = next((a for a in activities if a.get("name") == activity_name), None)
+
+    if target is None:
+
+        return None
+
+    depends_on = target.get("dependsOn") or target.get("depends_on") or []
+
+    dependency_names = {d.get("activity") if isinstance(d, dict) else d for d in depends_on}
+
+    properties = pipeline.get("properties", pipeline)
+
+    return {
 
+        "target_activity": target,
 
-def check_openai_connection():
+        "dependencies": [a for a in activities if a.get("name") in dependency_names],
 
-    """Performs a quick, low-cost check to verify the OpenAI connection and credentials."""
+        "parameters": properties.get("parameters"),
+
+        "variables": properties.get("variables"),
+
+    }
+
+
+@st.cache_data(ttl=3600, show_spinner=False)
+
+def get_pipeline_fix_json(pipeline_definition: str, error_message: str, activity_name: str) -> str:
+
+    """
+
+    Asks the LLM to analyze a pipeline definition and an error, and return a modified JSON to fix it.
+
+    Only the failed activity and its dependencies are sent when possible; the fixed activity is merged back into the full pipeline.
+
+    Results are memoized in-process for an hour per (definition, error, activity).
+
+    """
+
+    error_message = _normalize_error_message(error_message)
 
     try:
 
-        llm.invoke("test")
+        pipeline = orjson.loads(pipeline_definition)
+
+    except orjson.JSONDecodeError:
+
+        pipeline = None
+
+    focused = _focus_pipeline(pipeline, activity_name) if isinstance(pipeline, dict) else None
+
+    if focused is not None:
+
+        definition_label = "Relevant Pipeline Excerpt (JSON) — the failed activity under `target_activity`, the activities it depends on, and the pipeline parameters and variables"
+
+        definition_text = orjson.dumps(focused).decode()
+
+        fix_instruction = "Set `fixed_activity` to the complete, modified, and valid JSON of the failed activity only."
+
+    else:
+
+        definition_label = "Pipeline Definition (JSON)"
+
+        definition_text = pipeline_definition
+
+        fix_instruction = "Set `pipeline_definition` to the complete, modified, and valid JSON for the entire pipeline."
+
+    analysis_prompt = _FIX_PROMPT.substitute(
+
+        activity_name=activity_name,
+
+        fix_instruction=fix_instruction,
+
+        definition_label=definition_label,
+
+        definition_text=definition_text,
+
+        error_message=error_message,
+
+    )
+
+    fix = get_analysis_llm().with_structured_output(PipelineFix, method="function_calling").invoke(analysis_prompt)
+
+    if focused is not None:
+
+        # Only the excerpt was sent, so a pipeline_definition answer would drop the other activities;
+
+        # accept nothing but a single activity (every ADF activity has a type)
+
+        if fix.fixed_activity is not None and fix.fixed_activity.get("type"):
+
+            # Merge the fixed activity back into the full pipeline, keeping the original name
+
+            fix.fixed_activity["name"] = activity_name
+
+            activities = _pipeline_activities(pipeline)
+
+            for index, activity in enumerate(activities):
+
+                if activity.get("name") == activity_name:
+
+                    activities[index] = fix.fixed_activity
+
+                    break
+
+            return orjson.dumps(pipeline).decode()
+
+    elif fix.pipeline_definition is not None:
+
+        return orjson.dumps(fix.pipeline_definition).decode()
+
+    return orjson.dumps({"manual_intervention_required": fix.manual_intervention_required or "The model did not propose a fix for this error."}).decode()
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+
+def _probe_openai() -> bool:
+
+    """Sends a one-token request with a short timeout and no retries; raises on failure, so only success is cached."""
+
+    _new_llm(max_tokens=1, timeout=3, max_retries=0).invoke(".")
+
+    return True
+
+
+def check_openai_connection() -> bool:
+
+    """
+
+    Performs a quick, low-cost check to verify the OpenAI connection and credentials.
+
+    A successful check is cached for 60 seconds; a failed one is retried on the next call.
+
+    """
+
+    try:
 
-        return True
+        return _probe_openai()
 
     except Exception as e:
 
-        print(f"OpenAI connection check failed: {e}")
+        logger.warning("OpenAI connection check failed: %s", e)
 
         return False
  
\ No newline at end of file
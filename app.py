@@ -1,7 +1,60 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 import streamlit as st
-from agent import ChatAgent, check_openai_connection
-from azure_tools import list_all_data_factories_in_subscription
+from langchain_core.messages import messages_from_dict, messages_to_dict
+from agent import ChatAgent, _probe_openai, check_openai_connection, get_agent_executor
+from azure_tools import _list_all_data_factories_impl, list_all_data_factories_in_subscription
 st.set_page_config(layout="wide", page_icon="🤖", page_title="ADF AI Assistant")
+# --- CHAT PERSISTENCE ---
+SESSIONS_DIR = Path(os.getenv("ADF_ASSISTANT_SESSIONS_DIR") or Path.home() / ".adf_assistant" / "sessions")
+def chat_user_id():
+   """Returns the signed-in user when Streamlit auth is configured, else a random id kept in the page URL."""
+   if "chat_user_id" not in st.session_state:
+       user = getattr(st, "user", None)
+       if user is not None and user.get("is_logged_in"):
+           user_id = f"user:{user.get('email') or user.get('sub')}"
+       else:
+           sid = st.query_params.get("sid")
+           if not sid or not re.fullmatch(r"[0-9a-f]{32}", sid):
+               sid = uuid.uuid4().hex
+               st.query_params["sid"] = sid
+           user_id = f"sid:{sid}"
+       st.session_state.chat_user_id = user_id
+   return st.session_state.chat_user_id
+def chat_session_path():
+   """Returns the history file for the current user; the name is a hash so no identity ends up in the path."""
+   return SESSIONS_DIR / f"{hashlib.sha256(chat_user_id().encode('utf-8')).hexdigest()}.json"
+def load_chat_history():
+   """Loads the persisted chat messages, or an empty list if there are none."""
+   try:
+       return messages_from_dict(json.loads(chat_session_path().read_text(encoding="utf-8")))
+   except FileNotFoundError:
+       return []
+   except (ValueError, KeyError, TypeError) as e:
+       print(f"Ignoring unreadable chat history: {e}")
+       return []
+def save_chat_history():
+   """Writes the current chat messages to the user's history file."""
+   path = chat_session_path()
+   try:
+       path.parent.mkdir(parents=True, exist_ok=True)
+       # Write a temp file and swap it in, so a concurrent load never reads a partial file
+       fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+       try:
+           with os.fdopen(fd, "w", encoding="utf-8") as f:
+               json.dump(messages_to_dict(st.session_state.langchain_messages), f)
+           os.replace(tmp_path, path)
+       except Exception:
+           Path(tmp_path).unlink(missing_ok=True)
+           raise
+   except OSError as e:
+       print(f"Could not save chat history to {path}: {e}")
 # --- STATE MANAGEMENT ---
 def initialize_state():
    """Initializes session state variables."""
@@ -10,23 +63,35 @@ def initialize_state():
    st.session_state.initialized = True
    st.session_state.error = None
    st.session_state.all_adfs = []
+   st.session_state.adf_display_names = []
+   st.session_state.adf_by_display = {}
    st.session_state.selected_rg = None
    st.session_state.selected_adf = None
    st.session_state.chat_agent = None
    if "langchain_messages" not in st.session_state:
-       st.session_state.langchain_messages = []
+       st.session_state.langchain_messages = load_chat_history()
    st.session_state.azure_status = "Disconnected"
    st.session_state.openai_status = "Disconnected"
-   # Check Azure connection
-   with st.spinner("🔄 Connecting to Azure..."):
+   # Check the Azure and Azure OpenAI connections concurrently; both are independent network calls.
+   # The shared agent executor is built alongside so the first ChatAgent doesn't wait for it.
+   with st.spinner("🔄 Connecting to Azure and Azure OpenAI..."):
+       with ThreadPoolExecutor(max_workers=3) as executor:
+           adfs_future = executor.submit(list_all_data_factories_in_subscription.invoke, {})
+           openai_future = executor.submit(check_openai_connection)
+           executor.submit(get_agent_executor)
        try:
-           adfs = list_all_data_factories_in_subscription.invoke({})
+           adfs = adfs_future.result()
            if adfs and isinstance(adfs, list) and len(adfs) > 0:
                if isinstance(adfs[0], dict) and "error" in adfs[0]:
                    st.session_state.error = adfs[0]["error"]
                    st.session_state.azure_status = "Failed"
                else:
                    st.session_state.all_adfs = adfs
+                   # Build the selectbox labels and label -> factory lookup once per session
+                   st.session_state.adf_display_names = [
+                       f"{adf['factory_name']} ({adf['resource_group']})" for adf in adfs
+                   ]
+                   st.session_state.adf_by_display = dict(zip(st.session_state.adf_display_names, adfs))
                    st.session_state.azure_status = "Connected"
            else:
                st.session_state.all_adfs = []
@@ -34,9 +99,7 @@ def initialize_state():
        except Exception as e:
            st.session_state.error = str(e)
            st.session_state.azure_status = "Failed"
-   # Check OpenAI connection
-   with st.spinner("🔄 Checking Azure OpenAI connection..."):
-       if check_openai_connection():
+       if openai_future.result():
            st.session_state.openai_status = "Connected"
        else:
            st.session_state.openai_status = "Failed"
@@ -54,18 +117,13 @@ with st.sidebar:
        st.warning("⚠️ No Azure Data Factories found in your subscription.")
    else:
        # Data Factory selection
-       adf_display_names = [
-           f"{adf['factory_name']} ({adf['resource_group']})"
-           for adf in st.session_state.all_adfs
-       ]
        selected_display_name = st.selectbox(
            "Choose a Data Factory",
-           options=adf_display_names,
+           options=st.session_state.adf_display_names,
            help="Select the Azure Data Factory you want to work with"
        )
        if selected_display_name:
-           selected_index = adf_display_names.index(selected_display_name)
-           selected_adf_obj = st.session_state.all_adfs[selected_index]
+           selected_adf_obj = st.session_state.adf_by_display[selected_display_name]
            st.session_state.selected_adf = selected_adf_obj['factory_name']
            st.session_state.selected_rg = selected_adf_obj['resource_group']
            st.success(f"✅ Connected to: **{st.session_state.selected_adf}**")
@@ -86,15 +144,19 @@ with st.sidebar:
    st.divider()
    # Refresh button
    if st.button("🔄 Refresh Connection", use_container_width=True):
-       keys_to_clear = ['initialized', 'all_adfs', 'error', 'azure_status', 'openai_status', 'chat_agent']
+       keys_to_clear = ['initialized', 'all_adfs', 'adf_display_names', 'adf_by_display', 'error', 'azure_status', 'openai_status', 'chat_agent']
        for key in keys_to_clear:
            if key in st.session_state:
                del st.session_state[key]
+       # Only the connection checks; the shared error-analysis and fix caches stay warm
+       _list_all_data_factories_impl.clear()
+       _probe_openai.clear()
        st.rerun()
    # Clear chat button
    if st.button("🗑️ Clear Chat History", use_container_width=True):
        st.session_state.langchain_messages = []
        st.session_state.chat_agent = None
+       chat_session_path().unlink(missing_ok=True)
        st.rerun()
    st.divider()
    # Help section
@@ -134,18 +196,22 @@ if prompt := st.chat_input("Ask about your Data Factory..."):
    with st.chat_message("ai"):
        # Create a status container that updates in real-time
        status = st.status("🔍 Processing your query...", expanded=True)
+       # Placeholder that receives streamed tokens, then the final answer
+       placeholder = st.empty()
        try:
            # Get response from agent with streaming status updates
            response = st.session_state.chat_agent.get_agent_response(
                prompt,
                st.session_state.selected_rg,
                st.session_state.selected_adf,
-               status  # Pass status container for real-time updates
+               status,  # Pass status container for real-time updates
+               placeholder
            )
            # Mark status as complete and collapse it
            status.update(label="", state="complete", expanded=False)
            # Show response
-           st.markdown(response)
+           placeholder.markdown(response)
+           save_chat_history()
        except Exception as e:
            status.update(label="❌ Error occurred", state="error", expanded=False)
            st.error(f"An error occurred: {str(e)}\n\nPlease try again or rephrase your question.")
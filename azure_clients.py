@@ -0,0 +1,91 @@
+# azure_clients.py
+#
+# Azure SDK credential and clients, built lazily and shared by all reruns and sessions.
+# Spinners are disabled because the agent calls tools from worker threads.
+
+import atexit
+import os
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+from azure.core.credentials import TokenCredential
+from azure.core.pipeline.transport import RequestsTransport
+from azure.identity import ClientSecretCredential, DefaultAzureCredential, TokenCachePersistenceOptions
+from azure.mgmt.datafactory import DataFactoryManagementClient
+from azure.mgmt.resource import ResourceManagementClient
+
+
+_SERVICE_PRINCIPAL_VARS = ("AZURE_TENANT_ID", "AZURE_CLIENT_ID", "AZURE_CLIENT_SECRET")
+
+# Name of the on-disk MSAL token cache, so a restarted process reuses its tokens
+_TOKEN_CACHE_NAME = "adf-ai"
+
+
+def _make_credential() -> TokenCredential:
+    """
+    Uses the service principal from the environment when it is fully configured,
+    otherwise falls back to the default credential chain (managed identity, Azure CLI, ...).
+    Set AZURE_TOKEN_CACHE_PERSIST=1 to keep the service principal's tokens across restarts.
+    """
+    if all(os.getenv(var) for var in _SERVICE_PRINCIPAL_VARS):
+        kwargs = {}
+        # Opt-in: without libsecret (containers, SSH hosts) an encrypted cache makes get_token fail,
+        # unless AZURE_TOKEN_CACHE_ALLOW_UNENCRYPTED=1 allows a plaintext file instead
+        if os.getenv("AZURE_TOKEN_CACHE_PERSIST", "0") == "1":
+            kwargs["cache_persistence_options"] = TokenCachePersistenceOptions(
+                name=_TOKEN_CACHE_NAME,
+                allow_unencrypted_storage=os.getenv("AZURE_TOKEN_CACHE_ALLOW_UNENCRYPTED", "0") == "1",
+            )
+        return ClientSecretCredential(
+            tenant_id=os.getenv("AZURE_TENANT_ID"),
+            client_id=os.getenv("AZURE_CLIENT_ID"),
+            client_secret=os.getenv("AZURE_CLIENT_SECRET"),
+            **kwargs,
+        )
+    return DefaultAzureCredential()
+
+
+# Per-host connection pool size; above the parallel tool fan-out so concurrent calls don't queue
+_POOL_SIZE = 32
+
+
+def _make_transport() -> RequestsTransport:
+    """Builds a requests transport whose HTTPS pool fits the agent's concurrent tool calls."""
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_connections=_POOL_SIZE, pool_maxsize=_POOL_SIZE))
+    return RequestsTransport(session=session, session_owner=True)
+
+
+@st.cache_resource(show_spinner=False)
+def get_credential() -> TokenCredential:
+    """
+    Returns the Azure credential, created once per process.
+    Its token cache is reused by every client built from it.
+    """
+    credential = _make_credential()
+    atexit.register(credential.close)
+    return credential
+
+
+@st.cache_resource(show_spinner=False)
+def get_adf_client() -> DataFactoryManagementClient:
+    """Returns the Data Factory management client; its connection pool is shared across reruns and sessions."""
+    client = DataFactoryManagementClient(
+        credential=get_credential(),
+        subscription_id=os.getenv("AZURE_SUBSCRIPTION_ID"),
+        transport=_make_transport(),
+    )
+    atexit.register(client.close)
+    return client
+
+
+@st.cache_resource(show_spinner=False)
+def get_resource_client() -> ResourceManagementClient:
+    """Returns the Resource Management client, created on first use."""
+    client = ResourceManagementClient(
+        credential=get_credential(),
+        subscription_id=os.getenv("AZURE_SUBSCRIPTION_ID"),
+        transport=_make_transport(),
+    )
+    atexit.register(client.close)
+    return client
@@ -1,27 +1,40 @@
 # azure_tools.py
 
-import os
+import asyncio
+import inspect
+import itertools
+import orjson
+import re
+import threading
 import time
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from cachetools import TTLCache
 from dotenv import load_dotenv
-from azure.identity import ClientSecretCredential
-from azure.mgmt.datafactory import DataFactoryManagementClient
-from azure.mgmt.resource import ResourceManagementClient
+import streamlit as st
 from azure.mgmt.datafactory.models import PipelineResource
 from azure.core.exceptions import ResourceNotFoundError
 from langchain_core.tools import tool
+from azure_clients import get_adf_client
 
 load_dotenv()
 
-credential = ClientSecretCredential(
-    tenant_id=os.getenv("AZURE_TENANT_ID"),
-    client_id=os.getenv("AZURE_CLIENT_ID"),
-    client_secret=os.getenv("AZURE_CLIENT_SECRET"),
-)
+# Resource group segment of an ARM resource ID
+_RESOURCE_GROUP_RE = re.compile(r"/resourceGroups/([^/]+)", re.IGNORECASE)
 
-subscription_id = os.getenv("AZURE_SUBSCRIPTION_ID")
-adf_client = DataFactoryManagementClient(credential=credential, subscription_id=subscription_id)
-resource_client = ResourceManagementClient(credential=credential, subscription_id=subscription_id)
+
+# Short-lived caches for lookups the diagnose -> fix loop repeats; invalidated by update_pipeline
+_pipeline_definition_cache = TTLCache(maxsize=128, ttl=60)
+_pipeline_list_cache = TTLCache(maxsize=32, ttl=60)
+_cache_lock = threading.Lock()
+
+
+def _to_json(value) -> str:
+    """
+    Serializes a tool result as compact JSON for the LLM.
+    orjson handles datetimes natively; other SDK types fall back to str().
+    """
+    return orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS).decode()
 
 
 @tool
@@ -31,122 +44,255 @@ def list_all_data_factories_in_subscription() -> list:
     Returns a list of dictionaries, each containing the factory's name and its resource group.
     """
     try:
-        factories = adf_client.factories.list()
-        factory_details = []
-        for factory in factories:
-            rg_name = "Unknown"
-            try:
-                parts = factory.id.split("/")
-                rg_index = [part.lower() for part in parts].index("resourcegroups")
-                rg_name = parts[rg_index + 1]
-            except (ValueError, IndexError) as e:
-                print(f"Could not parse resource group from ID: {factory.id}. Error: {e}")
-
-            factory_details.append({
-                "factory_name": factory.name,
-                "resource_group": rg_name,
-            })
-        return factory_details
+        return _list_all_data_factories_impl()
     except Exception as e:
         return [{"error": f"Error listing all data factories: {e}"}]
 
 
+@st.cache_data(ttl=300, show_spinner=False)
+def _list_all_data_factories_impl() -> list:
+    """
+    Enumerates the subscription's factories; cached for 5 minutes across reruns and sessions.
+    Errors propagate so a transient failure is not cached.
+    """
+    factories = get_adf_client().factories.list()
+    factory_details = []
+    for factory in factories:
+        match = _RESOURCE_GROUP_RE.search(factory.id or "")
+        if match:
+            rg_name = match.group(1)
+        else:
+            rg_name = "Unknown"
+            print(f"Could not parse resource group from ID: {factory.id}")
+
+        factory_details.append({
+            "factory_name": factory.name,
+            "resource_group": rg_name,
+        })
+    return factory_details
+
+
 @tool
-def list_pipelines(resource_group_name: str, data_factory_name: str) -> list:
-    """Lists all pipelines in a given Azure Data Factory."""
+def list_pipelines(resource_group_name: str, data_factory_name: str, limit: int = 200) -> list:
+    """
+    Lists the pipelines in a given Azure Data Factory, up to `limit` names.
+    Only as many result pages as needed are fetched, so a small limit answers quick checks cheaply.
+    If the factory has more pipelines, the last entry says so; raise `limit` to see them.
+    """
+    key = (resource_group_name, data_factory_name, limit)
+    with _cache_lock:
+        cached = _pipeline_list_cache.get(key)
+    if cached is not None:
+        return list(cached)
     try:
-        pipelines = adf_client.pipelines.list_by_factory(
+        pipelines = get_adf_client().pipelines.list_by_factory(
             resource_group_name=resource_group_name, factory_name=data_factory_name
         )
-        return [p.name for p in pipelines]
+        # Read one past the limit to tell whether the listing was cut off
+        names = [p.name for p in itertools.islice(pipelines, limit + 1)]
+        if len(names) > limit:
+            names[limit:] = [f"...more pipelines not shown (limit={limit})"]
+        with _cache_lock:
+            _pipeline_list_cache[key] = names
+        return list(names)
     except Exception as e:
         return [f"Error listing pipelines: {e}"]
 
 
+def _format_run(run) -> dict:
+    """Converts an SDK PipelineRun into the summary dict returned to the agent."""
+    return {
+        "pipelineName": run.pipeline_name,
+        "runId": run.run_id,
+        "status": run.status,
+        "runStart": run.run_start,
+        "runEnd": run.run_end or "In Progress",
+        "durationInMs": run.duration_in_ms,
+        "message": run.message,
+    }
+
+
 @tool
 def get_pipeline_runs(
-    resource_group_name: str, data_factory_name: str, days: int, pipeline_name: str = None
-) -> list:
+    resource_group_name: str, data_factory_name: str, days: int, pipeline_name: str = None, status: str = None
+) -> str:
     """
-    Gets pipeline runs from the last N days.
+    Gets pipeline runs from the last N days, most recent first.
     If a pipeline_name is provided, it filters for that specific pipeline's runs.
+    If a status is provided (e.g. "Failed", "Succeeded", "InProgress"), only runs with that status
+    are returned. Both filters are applied by the service.
     """
     try:
+        now = datetime.now(timezone.utc)
+        filters = []
+        if pipeline_name:
+            filters.append({"operand": "PipelineName", "operator": "Equals", "values": [pipeline_name]})
+        if status:
+            filters.append({"operand": "Status", "operator": "Equals", "values": [status]})
         filter_params = {
-            "lastUpdatedAfter": datetime.utcnow() - timedelta(days=days),
-            "lastUpdatedBefore": datetime.utcnow(),
+            "lastUpdatedAfter": now - timedelta(days=days),
+            "lastUpdatedBefore": now,
+            "filters": filters,
+            "orderBy": [{"orderBy": "RunStart", "order": "DESC"}],
         }
-        runs = adf_client.pipeline_runs.query_by_factory(
+        runs = get_adf_client().pipeline_runs.query_by_factory(
             resource_group_name=resource_group_name,
             factory_name=data_factory_name,
             filter_parameters=filter_params,
         )
-        run_details = [
-            {
-                "pipelineName": run.pipeline_name,
-                "runId": run.run_id,
-                "status": run.status,
-                "runStart": run.run_start.isoformat(),
-                "runEnd": run.run_end.isoformat() if run.run_end else "In Progress",
-                "durationInMs": run.duration_in_ms,
-                "message": run.message,
-            }
-            for run in runs.value
-        ]
-        if pipeline_name:
-            return [run for run in run_details if run['pipelineName'] == pipeline_name]
-        return run_details
+        return _to_json([_format_run(run) for run in runs.value])
     except Exception as e:
-        return [f"Error getting pipeline runs: {e}"]
+        return _to_json([f"Error getting pipeline runs: {e}"])
+
+
+# Longest serialized input/output kept per activity in log summaries
+_PAYLOAD_PREVIEW_CHARS = 500
+
+
+def _trim_payload(value, limit: int = _PAYLOAD_PREVIEW_CHARS):
+    """Returns a short JSON preview of an activity input/output blob."""
+    if not value:
+        return None
+    text = _to_json(value)
+    return text if len(text) <= limit else text[:limit] + "…[truncated]"
+
+
+def _fetch_activity_runs(resource_group_name: str, data_factory_name: str, run_id: str) -> list:
+    """Fetches the SDK activity-run records of one pipeline run; raises on SDK errors."""
+    now = datetime.now(timezone.utc)
+    filter_params = {
+        "lastUpdatedAfter": now - timedelta(days=60),
+        "lastUpdatedBefore": now,
+    }
+    return get_adf_client().activity_runs.query_by_pipeline_run(
+        resource_group_name=resource_group_name,
+        factory_name=data_factory_name,
+        run_id=run_id,
+        filter_parameters=filter_params,
+    ).value
+
+
+def _query_activity_runs(resource_group_name: str, data_factory_name: str, run_id: str) -> list:
+    """
+    Summarizes the activity runs of one pipeline run; raises on SDK errors.
+    Errors are kept in full; input/output are only previewed, and only for failed activities.
+    """
+    return [
+        {
+            "activityName": ar.activity_name,
+            "status": ar.status,
+            "error": ar.error,
+            "input": _trim_payload(ar.input) if ar.status == "Failed" else None,
+            "output": _trim_payload(ar.output) if ar.status == "Failed" else None,
+        }
+        for ar in _fetch_activity_runs(resource_group_name, data_factory_name, run_id)
+    ]
 
 
 @tool
 def get_run_activity_logs(
     resource_group_name: str, data_factory_name: str, run_id: str
-) -> list:
+) -> str:
     """Gets the activity logs for a specific pipeline run, useful for debugging failed runs."""
     try:
-        filter_params = {
-            "lastUpdatedAfter": datetime.utcnow() - timedelta(days=60),
-            "lastUpdatedBefore": datetime.utcnow(),
-        }
-        activity_runs = adf_client.activity_runs.query_by_pipeline_run(
-            resource_group_name=resource_group_name,
-            factory_name=data_factory_name,
-            run_id=run_id,
-            filter_parameters=filter_params,
-        )
-        return [
-            {
-                "activityName": ar.activity_name,
-                "status": ar.status,
-                "error": ar.error,
-                "input": ar.input,
-                "output": ar.output,
-            }
-            for ar in activity_runs.value
-        ]
+        return _to_json(_query_activity_runs(resource_group_name, data_factory_name, run_id))
+    except Exception as e:
+        return _to_json([f"Error getting activity logs: {e}"])
+
+
+@tool
+def get_activity_full_payload(
+    resource_group_name: str, data_factory_name: str, run_id: str, activity_name: str
+) -> str:
+    """
+    Gets the complete, untruncated input, output and error of one activity in a pipeline run.
+    Activity logs only preview input/output; use this when the full payload is needed for a diagnosis.
+    """
+    try:
+        for ar in _fetch_activity_runs(resource_group_name, data_factory_name, run_id):
+            if ar.activity_name == activity_name:
+                return _to_json({
+                    "activityName": ar.activity_name,
+                    "status": ar.status,
+                    "error": ar.error,
+                    "input": ar.input,
+                    "output": ar.output,
+                })
+        return _to_json({"error": f"Activity '{activity_name}' not found in run '{run_id}'."})
     except Exception as e:
-        return [f"Error getting activity logs: {e}"]
+        return _to_json({"error": f"Error getting activity payload: {e}"})
+
+
+# Shared pool for fanning out per-run activity queries
+_ACTIVITY_LOG_POOL = ThreadPoolExecutor(max_workers=16, thread_name_prefix="adf-activity-logs")
+
+
+@tool
+def get_run_activity_logs_bulk(
+    resource_group_name: str, data_factory_name: str, run_ids: list[str]
+) -> str:
+    """
+    Gets the activity logs for several pipeline runs at once, fetching them in parallel.
+    Prefer this over repeated get_run_activity_logs calls when you already have a list of run IDs.
+    Returns a dictionary mapping each run ID to its activity logs.
+    """
+    futures = {
+        run_id: _ACTIVITY_LOG_POOL.submit(_query_activity_runs, resource_group_name, data_factory_name, run_id)
+        for run_id in dict.fromkeys(run_ids)
+    }
+    results = {}
+    for run_id, future in futures.items():
+        try:
+            results[run_id] = future.result()
+        except Exception as e:
+            results[run_id] = [f"Error getting activity logs: {e}"]
+    return _to_json(results)
+
+
+# Pipeline fields returned to the agent; matches what update_pipeline reads, plus the description
+_PIPELINE_DEFINITION_FIELDS = ("activities", "parameters", "variables", "annotations", "description")
+
+
+def _pipeline_properties(pipeline) -> dict:
+    """
+    Serializes an SDK PipelineResource without readonly fields and returns its pipeline properties.
+    azure-mgmt-datafactory 10.x takes `exclude_readonly` and nests them under "properties";
+    9.x takes `keep_readonly` and returns them at the top level.
+    """
+    if "exclude_readonly" in inspect.signature(pipeline.as_dict).parameters:
+        pipeline_dict = pipeline.as_dict(exclude_readonly=True)
+    else:
+        pipeline_dict = pipeline.as_dict(keep_readonly=False)
+    return pipeline_dict.get("properties", pipeline_dict)
 
 
 @tool
-def get_pipeline_definition(resource_group_name: str, data_factory_name: str, pipeline_name: str) -> dict:
+def get_pipeline_definition(resource_group_name: str, data_factory_name: str, pipeline_name: str) -> str:
     """
-    Retrieves the full JSON definition of a specific pipeline.
-    This is needed to understand the pipeline's structure before attempting a fix.
+    Retrieves the editable JSON definition of a specific pipeline: activities, parameters, variables, annotations and description.
+    This is needed to understand the pipeline's structure before attempting a fix, and is the shape update_pipeline accepts.
     """
+    key = (resource_group_name, data_factory_name, pipeline_name)
+    with _cache_lock:
+        cached = _pipeline_definition_cache.get(key)
+    if cached is not None:
+        return cached
     try:
-        pipeline = adf_client.pipelines.get(
+        pipeline = get_adf_client().pipelines.get(
             resource_group_name=resource_group_name,
             factory_name=data_factory_name,
             pipeline_name=pipeline_name,
         )
-        return pipeline.as_dict()
+        # Only the writable fields update_pipeline uses; readonly ARM metadata is dropped
+        pipeline_dict = _pipeline_properties(pipeline)
+        definition = _to_json({field: pipeline_dict.get(field) for field in _PIPELINE_DEFINITION_FIELDS})
+        with _cache_lock:
+            _pipeline_definition_cache[key] = definition
+        return definition
     except ResourceNotFoundError:
-        return {"error": f"Pipeline '{pipeline_name}' not found."}
+        return _to_json({"error": f"Pipeline '{pipeline_name}' not found."})
     except Exception as e:
-        return {"error": f"Error getting pipeline definition: {e}"}
+        return _to_json({"error": f"Error getting pipeline definition: {e}"})
 
 
 @tool
@@ -162,12 +308,17 @@ def update_pipeline(resource_group_name: str, data_factory_name: str, pipeline_n
             variables=pipeline_definition.get('variables'),
             annotations=pipeline_definition.get('annotations'),
         )
-        updated_pipeline = adf_client.pipelines.create_or_update(
+        updated_pipeline = get_adf_client().pipelines.create_or_update(
             resource_group_name=resource_group_name,
             factory_name=data_factory_name,
             pipeline_name=pipeline_name,
             pipeline=pipeline_resource
         )
+        # create_or_update may also add a pipeline, so drop the factory's listing too
+        with _cache_lock:
+            _pipeline_definition_cache.pop((resource_group_name, data_factory_name, pipeline_name), None)
+            for key in [k for k in _pipeline_list_cache if k[:2] == (resource_group_name, data_factory_name)]:
+                _pipeline_list_cache.pop(key, None)
         return {"status": "Success", "pipeline_name": updated_pipeline.name}
     except Exception as e:
         return {"error": f"Error updating pipeline: {e}"}
@@ -179,7 +330,7 @@ def create_pipeline_run(resource_group_name: str, data_factory_name: str, pipeli
     Creates a new run for a specified pipeline and returns the run ID.
     """
     try:
-        run_response = adf_client.pipelines.create_run(
+        run_response = get_adf_client().pipelines.create_run(
             resource_group_name=resource_group_name,
             factory_name=data_factory_name,
             pipeline_name=pipeline_name,
@@ -195,7 +346,7 @@ def get_pipeline_run(resource_group_name: str, data_factory_name: str, run_id: s
     Retrieves the details of a specific pipeline run, including its status.
     """
     try:
-        run = adf_client.pipeline_runs.get(
+        run = get_adf_client().pipeline_runs.get(
             resource_group_name=resource_group_name,
             factory_name=data_factory_name,
             run_id=run_id,
@@ -206,4 +357,46 @@ def get_pipeline_run(resource_group_name: str, data_factory_name: str, run_id: s
             "message": run.message,
         }
     except Exception as e:
-        return {"error": f"Error getting pipeline run status: {e}"}
\ No newline at end of file
+        return {"error": f"Error getting pipeline run status: {e}"}
+
+
+_BATCHABLE_TOOLS = {
+    t.name: t
+    for t in (
+        list_pipelines,
+        get_pipeline_runs,
+        get_run_activity_logs,
+        get_run_activity_logs_bulk,
+        get_activity_full_payload,
+        get_pipeline_definition,
+        get_pipeline_run,
+    )
+}
+
+
+@tool
+async def batch(invocations: list[dict]) -> str:
+    """
+    Runs several independent read-only tools concurrently in a single step.
+    Each invocation is a dict with "tool_name" and "arguments" keys, e.g.
+    {"tool_name": "get_pipeline_definition", "arguments": {"resource_group_name": ..., ...}}.
+    Supported tools: list_pipelines, get_pipeline_runs, get_run_activity_logs,
+    get_run_activity_logs_bulk, get_activity_full_payload, get_pipeline_definition,
+    get_pipeline_run.
+    Returns one result per invocation, in the same order.
+    """
+    async def run_one(invocation: dict) -> dict:
+        tool_name = invocation.get("tool_name")
+        target = _BATCHABLE_TOOLS.get(tool_name)
+        if target is None:
+            return {"tool_name": tool_name, "error": f"Tool '{tool_name}' cannot be used in a batch."}
+        try:
+            result = await target.ainvoke(invocation.get("arguments", {}))
+        except Exception as e:
+            return {"tool_name": tool_name, "error": f"Error running {tool_name}: {e}"}
+        # Results that are already JSON are embedded as-is rather than re-encoded as strings
+        if isinstance(result, str):
+            result = orjson.Fragment(result)
+        return {"tool_name": tool_name, "result": result}
+
+    return _to_json(list(await asyncio.gather(*(run_one(i) for i in invocations))))